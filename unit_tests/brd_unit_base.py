@@ -78,15 +78,25 @@ class BrdUnitBase(unittest.TestCase):
         self.default_db = os.path.basename(self.script_name) + '.db'
 
         # Remove the database, if it exists
-        if os.path.exists( self.default_db ):
-            os.unlink( self.default_db )
+        self.remove_db( self.default_db )
 
     def tearDown(self):
         """General cleanup
         """
-        # Remove the database, if it exists
-        if os.path.exists( self.default_db ):
-            os.unlink( self.default_db )
+        # Close any connection left open by the test, then remove the database
+        if getattr( self, 'conn', None ) != None:
+            self.conn.close()
+            self.conn = None
+        self.remove_db( self.default_db )
+
+    def remove_db(self, db_url):
+        """Removes the specified database along with its write-ahead log, if
+        they exist. A leftover log would otherwise be applied to the next 
+        database created with the same name.
+        """
+        for filename in ( db_url, db_url + '-wal', db_url + '-shm' ):
+            if os.path.exists( filename ):
+                os.unlink( filename )
         
     def read_in_chunks(self, file_obj, chunk_size=1024*1024):
         """Generator to read data from the specified file in chunks.
@@ -0,0 +1,184 @@
+#    brd - scans directories and files for damage due to decay of medium.
+#    Copyright (C) 2013 Jeff Backus <jeff.backus@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import unittest
+import datetime
+import time
+import shutil
+
+from brd_unit_base import BrdUnitBase
+
+# Import brd in order to use some of its functions
+# Note: we're expecting brd_unit_base to take care of path stuff
+import brd
+
+class TestChanges(BrdUnitBase):
+    """Unit tests for the changes and apply_journal subcommands.
+    """
+
+    def setUp(self):
+        # Call superclass's setup routine.
+        super(TestChanges,self).setUp()
+
+        # Define replica and change list names
+        self.replica_db = 'test_replica.db'
+        self.remove_db( self.replica_db )
+        self.change_list = 'test_changes.jsonl'
+        
+    def tearDown(self):
+        # Clean up test tree, replica and change list
+        shutil.rmtree('test_tree')
+        self.remove_db( self.replica_db )
+        if os.path.exists( self.change_list ):
+            os.unlink( self.change_list )
+
+        # Call superclass's cleanup routine
+        super(TestChanges,self).tearDown()
+
+    def modify_tree(self, root_name, mod_time):
+        """Updates one file, removes a subdirectory and adds a file to the
+        tree built from schema 1.
+        """
+
+        file_name = os.path.join( root_name, 'BunchOfCs.txt' )
+        with open( file_name, 'wt' ) as f:
+            f.write( 'e' * 256 + os.linesep )
+        tmp_time = mod_time.timestamp() + 60
+        os.utime( file_name, ( tmp_time, tmp_time ) )
+
+        shutil.rmtree( os.path.join( root_name, 'LeafB' ) )
+
+        with open( os.path.join( root_name, 'NewFile.txt' ), 'wt' ) as f:
+            f.write( 'f' * 256 + os.linesep )
+
+    def get_db_contents(self, db_url):
+        """Returns all rows of the files, dirs and digests tables of the 
+        specified database.
+        """
+
+        self.open_db( db_url, True )
+        cursor = self.conn.cursor()
+        ret_val = []
+        # LastChecked and Generation aren't replicated.
+        for (table, cols) in ( ('files', 'File_ID,Name,Parent_ID,' + 
+                                'LastModified,Fingerprint,Size,Checksum'), 
+                               ('dirs', 'Path_ID,Name,Parent_ID,Checksum'),
+                               ('digests', 'Root_ID,Digest,Rows') ):
+            cursor.execute("SELECT " + cols + " FROM '" + 
+                           self.table_names[table] + "' ORDER BY " + 
+                           cols.split(',')[0])
+            ret_val.append( cursor.fetchall() )
+        self.conn.close()
+
+        return ret_val
+
+    def test_text(self):
+        """Tests changes subcommand with text output after a rescan.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        root_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', root_name],
+                                universal_newlines=True)
+
+        # Change the tree and rescan
+        file_name = os.path.join( root_name, 'BunchOfCs.txt' )
+        old_fp = self.calc_fingerprint( file_name )
+        self.modify_tree( root_name, mod_time )
+        subprocess.check_output([self.script_name, 'scan', '--prune', 
+                                 root_name], universal_newlines=True)
+
+        scr_out = subprocess.check_output([self.script_name, 'changes', 
+                                           '--since', '1'],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+
+        # Verify results
+        leaf_name = os.path.join( root_name, 'LeafB' )
+        exp_lines = [ "    Added file '" + 
+                      os.path.join( root_name, 'NewFile.txt' ) + "'",
+                      "    Removed file '" + 
+                      os.path.join( leaf_name, 'BunchOfAs.txt' ) + "'",
+                      "    Removed file '" + 
+                      os.path.join( leaf_name, 'BunchOfBs.txt' ) + "'",
+                      "    Removed directory '" + leaf_name + "'",
+                      "    Updated file '" + file_name + "' (" + old_fp +
+                      " -> " + self.calc_fingerprint( file_name ) + ")" ]
+        lines = scr_out.splitlines()
+        self.assertTrue( lines[0].startswith( 'Scan 2 (scan by process ' ) )
+        self.assertEqual( sorted( lines[1:] ), sorted( exp_lines ) )
+
+    def test_replicate(self):
+        """Tests shipping changes to a replica with apply_journal.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        root_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', root_name],
+                                universal_newlines=True)
+
+        # Start the replica from scratch
+        subprocess.check_output([self.script_name, 'changes', '-f', 'jsonl',
+                                 '-o', self.change_list], 
+                                universal_newlines=True)
+        scr_out = subprocess.check_output([self.script_name, '--db', 
+                                           self.replica_db, 'apply_journal',
+                                           self.change_list],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+        self.assertEqual( self.get_db_contents( self.default_db ),
+                          self.get_db_contents( self.replica_db ) )
+
+        # Change the tree and rescan, then ship only the new changes.
+        self.modify_tree( root_name, mod_time )
+        subprocess.check_output([self.script_name, 'scan', '--prune', 
+                                 root_name], universal_newlines=True)
+        position = subprocess.check_output([self.script_name, '--db', 
+                                            self.replica_db, 'apply_journal',
+                                            '--position'],
+                                           universal_newlines=True)
+        subprocess.check_output([self.script_name, 'changes', '-f', 'jsonl',
+                                 '--after', position.strip(), '-o', 
+                                 self.change_list], universal_newlines=True)
+        scr_out = subprocess.check_output([self.script_name, '--db', 
+                                           self.replica_db, 'apply_journal',
+                                           self.change_list],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        # Verify results
+        self.assertEqual( self.get_db_contents( self.default_db ),
+                          self.get_db_contents( self.replica_db ) )
+
+# Allow unit test to run on its own
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,7 @@
 from __future__ import unicode_literals
 
 import os
+import subprocess
 import unittest
 
 from brd_unit_base import BrdUnitBase
@@ -34,17 +35,20 @@ class TestCheckDB(BrdUnitBase):
         # Call superclass's setup routine.
         super(TestCheckDB,self).setUp()
         
-        # Define default fingerprint file
+        # Define default fingerprint and page manifest files
         self.default_fp_file = self.default_db + '.sha1'
+        self.default_pages_file = self.default_db + '.pages'
 
-        # Remove fingerprint file
-        if os.path.exists( self.default_fp_file ):
-            os.unlink( self.default_fp_file )
+        # Remove fingerprint and page manifest files
+        for filename in ( self.default_fp_file, self.default_pages_file ):
+            if os.path.exists( filename ):
+                os.unlink( filename )
 
     def tearDown(self):
-        # Remove fingerprint file
-        if os.path.exists( self.default_fp_file ):
-            os.unlink( self.default_fp_file )
+        # Remove fingerprint and page manifest files
+        for filename in ( self.default_fp_file, self.default_pages_file ):
+            if os.path.exists( filename ):
+                os.unlink( filename )
 
         # Call superclass's cleanup routine
         super(TestCheckDB,self).tearDown()
@@ -185,6 +189,156 @@ class TestCheckDB(BrdUnitBase):
         self.assertNotEqual( expect_fp, new_fp )
         self.assertEqual( orig_fp, new_fp )
 
+    def test_pages_update(self):
+        """Tests the --pages option on an updated database.
+        """
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+        # Close connection
+        self.conn.close()
+
+        # Generate the page manifest
+        os.system( self.script_name + ' checkdb --pages --block-size 4096' )
+        self.assertTrue( os.path.exists( self.default_pages_file ) )
+        with open( self.default_pages_file, 'rb' ) as f:
+            orig_manifest = f.read()
+
+        # Open database again, and this time populate it with schema 1.
+        self.open_db( self.default_db, False )
+        self.populate_db_from_tree( self.get_schema_1() )
+        self.conn.close()
+
+        # Make sure the database is newer than the manifest.
+        st = os.stat( self.default_pages_file )
+        os.utime( self.default_db, ( st.st_mtime + 1, st.st_mtime + 1 ) )
+
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--pages'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        # Verify that the manifest was updated to match a new manifest.
+        with open( self.default_pages_file, 'rb' ) as f:
+            got_manifest = f.read()
+        os.unlink( self.default_pages_file )
+        os.system( self.script_name + ' checkdb --pages --block-size 4096' )
+        with open( self.default_pages_file, 'rb' ) as f:
+            exp_manifest = f.read()
+
+        self.assertNotEqual( orig_manifest, got_manifest )
+        self.assertEqual( exp_manifest, got_manifest )
+
+    def test_pages_damaged(self):
+        """Tests the --pages option on a database that was changed without
+        being modified.
+        """
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+        self.populate_db_from_tree( self.get_schema_1() )
+        self.conn.close()
+
+        # Generate the page manifest
+        os.system( self.script_name + ' checkdb --pages --block-size 4096' )
+
+        # Damage the second page, keeping the modification time.
+        st = os.stat( self.default_db )
+        with open( self.default_db, 'r+b' ) as f:
+            f.seek( 4096 + 100 )
+            data = f.read( 1 )
+            f.seek( 4096 + 100 )
+            f.write( bytes( [ data[0] ^ 0xff ] ) )
+        os.utime( self.default_db, ( st.st_atime, st.st_mtime - 10 ) )
+
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--pages'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+
+        # Verify results
+        self.assertTrue( 0 <= scr_out.find( 'in pages 2. Database could ' +
+                                            'be damaged!' ) )
+
+    def test_pages_bad_manifest(self):
+        """Tests the --pages option with a damaged page manifest, which should
+        be reported and, without --check-only, regenerated.
+        """
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+        self.populate_db_from_tree( self.get_schema_1() )
+        self.conn.close()
+
+        # Generate the page manifest
+        os.system( self.script_name + ' checkdb --pages' )
+        with open( self.default_pages_file, 'rb' ) as f:
+            exp_manifest = f.read()
+
+        for bad_manifest in ( b'garbage\n' + exp_manifest, 
+                              exp_manifest[:-5] ):
+            with open( self.default_pages_file, 'wb' ) as f:
+                f.write( bad_manifest )
+
+            scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                               '--pages', '--check-only'], 
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertTrue( 0 <= scr_out.find( "Page manifest '" + 
+                                                self.default_pages_file +
+                                                "' is damaged" ) )
+            with open( self.default_pages_file, 'rb' ) as f:
+                self.assertEqual( f.read(), bad_manifest )
+
+            scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                               '--pages'], 
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertTrue( 0 <= scr_out.find( 'Generating a new one.' ) )
+            with open( self.default_pages_file, 'rb' ) as f:
+                self.assertEqual( f.read(), exp_manifest )
+
+    def test_rows(self):
+        """Tests the --rows option on a database with a damaged record and a
+        lost record.
+        """
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+        self.populate_db_from_tree( self.get_schema_1() )
+        self.conn.close()
+
+        # Records added behind brd's back don't have checksums yet.
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--rows'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        # Damage one record and remove another
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE '" + self.table_names['files'] + "' SET " +
+                       "Size=1 WHERE File_ID=2")
+        cursor.execute("DELETE FROM '" + self.table_names['files'] + 
+                       "' WHERE File_ID=3")
+        self.conn.commit()
+        self.conn.close()
+
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--rows'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+
+        # Verify results
+        self.assertTrue( 0 <= scr_out.find( "Record for 'BunchOfBs.txt' " +
+                                            "(File_ID = 2, Parent_ID = 3) " +
+                                            "does not match its checksum." ) )
+        self.assertTrue( 0 <= scr_out.find( "Digest of root 'rootA' does " +
+                                            "not match its 9 records " +
+                                            "(expected 10)." ) )
+
 # Allow unit test to run on its own
 if __name__ == '__main__':
     unittest.main()
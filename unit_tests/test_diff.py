@@ -22,6 +22,7 @@ import subprocess
 import unittest
 import datetime
 import time
+import shutil
 
 from brd_unit_base import BrdUnitBase
 
@@ -38,6 +39,10 @@ class TestDiff(BrdUnitBase):
         super(TestDiff,self).setUp()
         
     def tearDown(self):
+        # Clean up test tree, if any
+        if os.path.exists('test_tree'):
+            shutil.rmtree('test_tree')
+
         # Call superclass's cleanup routine
         super(TestDiff,self).tearDown()
 
@@ -375,6 +380,120 @@ class TestDiff(BrdUnitBase):
         for exp_line in exp_out:
             self.assertTrue( exp_line in scr_lines )
 
+    def test_changed_subtrees(self):
+        """Tests that diff finds changes in every subdirectory, including
+        changes that keep the size of a file, and skips identical subtrees.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build two copies of schema 1 and change a file in two different
+        # subdirectories of one of them, keeping their sizes.
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        self.build_tree( self.get_schema_1( mod_time, check_time,
+                                            root_name = 'rootB' ) )
+        root_a = os.path.join('test_tree', 'rootA')
+        root_b = os.path.join('test_tree', 'rootB')
+        changed = [ os.path.join('LeafB', 'BunchOfAs.txt'),
+                    os.path.join('TreeA', 'DirA', 'LeafA', 'BunchOfBs.txt') ]
+        for path in changed:
+            with open( os.path.join( root_b, path ), 'wt' ) as f:
+                f.write( 'z'*256 )
+        subprocess.check_output([self.script_name, 'scan', root_a, root_b],
+                                universal_newlines=True)
+
+        exp_out = sorted([ os.path.join( root_a, path ) + ' and ' +
+                           os.path.join( root_b, path ) + ' differ.'
+                           for path in changed ])
+        scr_out = subprocess.check_output([self.script_name, 'diff',
+                                           root_a, root_b],
+                                          universal_newlines=True)
+        self.assertEqual( sorted(scr_out.splitlines()), exp_out )
+
+        # Once only one subtree differs, the other is skipped.
+        shutil.copy( os.path.join( root_a, changed[1] ),
+                     os.path.join( root_b, changed[1] ) )
+        subprocess.check_output([self.script_name, 'scan', root_b],
+                                universal_newlines=True)
+        scr_out = subprocess.check_output([self.script_name, '-d', '-l',
+                                           'diff.log', 'diff', root_a,
+                                           root_b],
+                                          stderr=subprocess.DEVNULL,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out.splitlines(), exp_out[:1] )
+        with open('diff.log', 'rt') as f:
+            self.assertTrue( 'Identical subtrees skipped: 1' in f.read() )
+        os.unlink('diff.log')
+
+        # Identical trees aren't walked at all.
+        shutil.copy( os.path.join( root_a, changed[0] ),
+                     os.path.join( root_b, changed[0] ) )
+        subprocess.check_output([self.script_name, 'scan', root_b],
+                                universal_newlines=True)
+        scr_out = subprocess.check_output([self.script_name, '-d', '-l',
+                                           'diff.log', 'diff', root_a,
+                                           root_b],
+                                          stderr=subprocess.DEVNULL,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+        with open('diff.log', 'rt') as f:
+            self.assertTrue( 'Targets have the same fingerprint.' in f.read() )
+        os.unlink('diff.log')
+
+    def test_other_db(self):
+        """Tests diff subcommand with the second target in another database.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+        other_db = 'other.db'
+
+        # Scan schema 1 into the default database, then change and remove
+        # files and add a directory and scan it into the other database.
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        root_a = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', root_a],
+                                universal_newlines=True)
+        leaf_b = os.path.join(root_a, 'LeafB')
+        changed = os.path.join(leaf_b, 'BunchOfAs.txt')
+        with open( changed, 'wt' ) as f:
+            f.write( 'z'*256 )
+        os.unlink( os.path.join(leaf_b, 'BunchOfBs.txt') )
+        os.makedirs( os.path.join(root_a, 'TreeA', 'DirB') )
+        with open( os.path.join(root_a, 'TreeA', 'DirB', 'New.txt'),
+                   'wt' ) as f:
+            f.write( 'new' )
+        subprocess.check_output([self.script_name, '--db', other_db, 'scan',
+                                 root_a], universal_newlines=True)
+
+        try:
+            scr_out = subprocess.check_output([self.script_name, 'diff',
+                                               '--other-db', other_db,
+                                               root_a, root_a],
+                                              universal_newlines=True)
+            self.assertEqual( scr_out.splitlines(),
+                              [ changed + ' and ' + changed + ' differ.',
+                                'Only in ' + leaf_b + ': BunchOfBs.txt',
+                                'Only in ' + os.path.join(root_a, 'TreeA') +
+                                ': DirB' ] )
+
+            # Files and identical subtrees
+            scr_out = subprocess.check_output([self.script_name, 'diff',
+                                               '--other-db', other_db,
+                                               changed, changed],
+                                              universal_newlines=True)
+            self.assertEqual( scr_out, changed + ' and ' + changed +
+                              ' differ.\n' )
+            dir_a = os.path.join(root_a, 'TreeA', 'DirA')
+            scr_out = subprocess.check_output([self.script_name, 'diff',
+                                               '--other-db', other_db,
+                                               dir_a, dir_a],
+                                              universal_newlines=True)
+            self.assertEqual( scr_out, '' )
+        finally:
+            os.unlink(other_db)
+
     # def test_file_target_wildcard(self):
     #     """Tests diff subcommand with wildcards.
     #     """
@@ -0,0 +1,119 @@
+#    brd - scans directories and files for damage due to decay of medium.
+#    Copyright (C) 2013 Jeff Backus <jeff.backus@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import unittest
+import datetime
+import time
+import shutil
+import json
+
+from brd_unit_base import BrdUnitBase
+
+# Import brd in order to use some of its functions
+# Note: we're expecting brd_unit_base to take care of path stuff
+import brd
+
+class TestDu(BrdUnitBase):
+    """Unit tests for the du subcommand.
+    """
+
+    def setUp(self):
+        # Call superclass's setup routine.
+        super(TestDu,self).setUp()
+
+    def tearDown(self):
+        # Clean up test tree
+        shutil.rmtree('test_tree')
+
+        # Call superclass's cleanup routine
+        super(TestDu,self).tearDown()
+
+    def get_du(self, target, depth):
+        """Runs du -f jsonl on the specified target and returns a dict of
+        path => (files, bytes).
+        """
+
+        scr_out = subprocess.check_output([self.script_name, 'du', '-f',
+                                           'jsonl', '-d', str(depth), target],
+                                          universal_newlines=True)
+        ret_val = dict()
+        for line in scr_out.splitlines():
+            entry = json.loads(line)
+            ret_val[ entry['path'] ] = ( entry['files'], entry['bytes'] )
+        return ret_val
+
+    def test_du(self):
+        """Tests that du reports the aggregates of a scanned tree, and that
+        they follow removals and additions.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+        target_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+
+        # Verify text output, children first
+        scr_out = subprocess.check_output([self.script_name, 'du',
+                                           target_name],
+                                          universal_newlines=True)
+        lines = [ line.split('\t') for line in scr_out.splitlines() ]
+        self.assertEqual( [ ( line[0], line[1], line[4] ) for line in lines ],
+                          [ ( '514', '2', os.path.join( target_name,
+                                                        'LeafB' ) ),
+                            ( '514', '2', os.path.join( target_name,
+                                                        'TreeA' ) ),
+                            ( '1285', '5', target_name ) ] )
+        for line in lines:
+            self.assertEqual( line[2], mod_time.strftime('%Y-%m-%d %H:%M:%S') )
+            self.assertNotEqual( line[3], 'never' )
+
+        # Remove a subdirectory and add a file, then check every level.
+        subprocess.check_output([self.script_name, 'rm',
+                                 os.path.join( target_name, 'LeafB' )],
+                                universal_newlines=True)
+        self.assertEqual( self.get_du( target_name, 0 ),
+                          { target_name : ( 3, 771 ) } )
+        shutil.rmtree( os.path.join( target_name, 'LeafB' ) )
+        with open( os.path.join( target_name, 'TreeA', 'DirA', 'New.txt' ),
+                   'wt' ) as f:
+            f.write( 'n' * 99 )
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+
+        got_du = self.get_du( target_name, -1 )
+        tree_a = os.path.join( target_name, 'TreeA' )
+        self.assertEqual( got_du,
+                          { target_name : ( 4, 870 ), tree_a : ( 3, 613 ),
+                            os.path.join( tree_a, 'DirA' ) : ( 3, 613 ),
+                            os.path.join( tree_a, 'DirA', 'LeafA' ) :
+                            ( 2, 514 ) } )
+        self.assertEqual( self.get_du( target_name, 0 ),
+                          { target_name : ( 4, 870 ) } )
+
+# Allow unit test to run on its own
+if __name__ == '__main__':
+    unittest.main()
@@ -254,6 +254,207 @@ class TestDupeFiles(BrdUnitBase):
         # Clean up
         os.unlink( out_file )
         
+    def test_wasted(self):
+        """Tests dupe_files subcommand with --sort wasted, --top and 
+        --min-size.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+        fp_a = '0x1a0372738bb5b4b8360b47c4504a27e6f4811493'
+        fp_b = '0xfa75bf047f45891daee8f1fa4cd2bf58876770a5'
+        fp_c = '0xb145bb8710c9b6624bb46631eecc3bbcc335d0ab'
+        group_a = \
+            ['4 files with Fingerprint ' + fp_a + 
+             ' (257 bytes each, 771 bytes wasted):',
+             '    [rootA]/LeafB/BunchOfAs.txt',
+             '    [rootA]/TreeA/DirA/LeafA/BunchOfAs.txt',
+             '    [rootB]/LeafB/BunchOfAs.txt',
+             '    [rootB]/TreeA/DirA/LeafA/BunchOfAs.txt']
+        group_b = \
+            ['4 files with Fingerprint ' + fp_b + 
+             ' (257 bytes each, 771 bytes wasted):',
+             '    [rootA]/LeafB/BunchOfBs.txt',
+             '    [rootA]/TreeA/DirA/LeafA/BunchOfBs.txt',
+             '    [rootB]/LeafB/BunchOfBs.txt',
+             '    [rootB]/TreeA/DirA/LeafA/BunchOfBs.txt']
+        group_c = \
+            ['2 files with Fingerprint ' + fp_c + 
+             ' (4096 bytes each, 4096 bytes wasted):',
+             '    [rootA]/BunchOfCs.txt',
+             '    [rootB]/BunchOfCs.txt']
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with two copies of schema 1, with a larger
+        # BunchOfCs.txt.
+        for (root_name, first_id) in (('rootA', 1), ('rootB', 6)):
+            exp_data = self.get_schema_1( mod_time, check_time, 
+                                          root_name = root_name, 
+                                          first_file_id = first_id,
+                                          first_dir_id = first_id )
+            exp_data['roots'][root_name]['children']['BunchOfCs.txt']\
+                ['Size'] = 4096
+            self.populate_db_from_tree( exp_data )
+        self.conn.close()
+
+        # Groups that waste the most come first, ties by fingerprint.
+        scr_out = subprocess.check_output([self.script_name, 'dupe_files',
+                                           '--sort', 'wasted'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out.splitlines(), group_c + group_a + group_b )
+
+        # Check --top
+        scr_out = subprocess.check_output([self.script_name, 'dupe_files',
+                                           '--sort', 'wasted', '--top', '2'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out.splitlines(), group_c + group_a )
+
+        # Check --min-size, which leaves the default headers alone
+        scr_out = subprocess.check_output([self.script_name, 'dupe_files',
+                                           '--min-size', '258'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out.splitlines(), 
+                          [ '2 files with Fingerprint ' + fp_c + ':' ] +
+                          group_c[1:] )
+
+    def test_group_order(self):
+        """Tests that dupe_files lists groups in fingerprint order and the
+        files of each group in the order they were added, and leaves out
+        files without a fingerprint.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+        group_a = \
+            ['4 files with Fingerprint ' +
+             '0x1a0372738bb5b4b8360b47c4504a27e6f4811493:',
+             '    [rootA]/LeafB/BunchOfAs.txt',
+             '    [rootA]/TreeA/DirA/LeafA/BunchOfAs.txt',
+             '    [rootB]/LeafB/BunchOfAs.txt',
+             '    [rootB]/TreeA/DirA/LeafA/BunchOfAs.txt']
+        group_c = \
+            ['2 files with Fingerprint ' +
+             '0xb145bb8710c9b6624bb46631eecc3bbcc335d0ab:',
+             '    [rootA]/BunchOfCs.txt',
+             '    [rootB]/BunchOfCs.txt']
+        group_b = \
+            ['2 files with Fingerprint ' +
+             '0xfa75bf047f45891daee8f1fa4cd2bf58876770a5:',
+             '    [rootA]/LeafB/BunchOfBs.txt',
+             '    [rootA]/TreeA/DirA/LeafA/BunchOfBs.txt']
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with two copies of schema 1, where the
+        # BunchOfBs.txt files of the second have no fingerprint yet.
+        self.populate_db_from_tree(
+            self.get_schema_1( mod_time, check_time ) )
+        exp_data = self.get_schema_1( mod_time, check_time,
+                                      root_name = 'rootB', first_file_id=6,
+                                      first_dir_id=6 )
+        root_b = exp_data['roots']['rootB']['children']
+        root_b['LeafB']['children']['BunchOfBs.txt']['Fingerprint'] = None
+        root_b['TreeA']['children']['DirA']['children']['LeafA']\
+            ['children']['BunchOfBs.txt']['Fingerprint'] = None
+        self.populate_db_from_tree( exp_data )
+        self.conn.close()
+
+        # Only the copies of BunchOfAs.txt are duplicates within rootB.
+        checks = [ ( [], group_a + group_c + group_b ),
+                   ( ['--top', '2'], group_a + group_c ),
+                   ( ['--sort', 'wasted', '--top', '1', '--min-size', '1'],
+                     [ group_a[0][:-1] + ' (257 bytes each, 771 bytes ' +
+                       'wasted):' ] + group_a[1:] ),
+                   ( ['--within', 'rootB'], 
+                     [ group_a[0].replace('4 files', '2 files') ] + 
+                     group_a[3:] ) ]
+        for (args, exp_out) in checks:
+            scr_out = subprocess.check_output([self.script_name,
+                                               'dupe_files'] + args,
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertEqual( scr_out.splitlines(), exp_out )
+
+    def test_scope_options(self):
+        """Tests dupe_files subcommand with --within and --between options.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+        header_a = '2 files with Fingerprint ' + \
+            '0x1a0372738bb5b4b8360b47c4504a27e6f4811493:'
+        header_b = '2 files with Fingerprint ' + \
+            '0xfa75bf047f45891daee8f1fa4cd2bf58876770a5:'
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with schema 1
+        self.populate_db_from_tree( 
+            self.get_schema_1( mod_time, check_time ) )
+        # Append another schema 1 with a new root name
+        self.populate_db_from_tree( 
+            self.get_schema_1( mod_time, check_time, 
+                               root_name = 'rootB', first_file_id=6,
+                               first_dir_id=6) )
+        self.conn.close()
+
+        # Each entry is (arguments, expected output)
+        checks = [ ( ['--within', 'rootA/TreeA'], [] ),
+                   ( ['--within', 'rootA'],
+                     [ header_a, '    [rootA]/TreeA/DirA/LeafA/BunchOfAs.txt',
+                       '    [rootA]/LeafB/BunchOfAs.txt',
+                       header_b, '    [rootA]/TreeA/DirA/LeafA/BunchOfBs.txt',
+                       '    [rootA]/LeafB/BunchOfBs.txt' ] ),
+                   ( ['--within', 'rootA/TreeA', '--within', 'rootB/LeafB'],
+                     [ header_a, '    [rootA]/TreeA/DirA/LeafA/BunchOfAs.txt',
+                       '    [rootB]/LeafB/BunchOfAs.txt',
+                       header_b, '    [rootA]/TreeA/DirA/LeafA/BunchOfBs.txt',
+                       '    [rootB]/LeafB/BunchOfBs.txt' ] ),
+                   ( ['--between', 'rootA', 'rootB', '--min-size', '1'],
+                     [ '4 files with Fingerprint ' + 
+                       '0x1a0372738bb5b4b8360b47c4504a27e6f4811493:',
+                       '    [rootA]/TreeA/DirA/LeafA/BunchOfAs.txt',
+                       '    [rootA]/LeafB/BunchOfAs.txt',
+                       '    [rootB]/TreeA/DirA/LeafA/BunchOfAs.txt',
+                       '    [rootB]/LeafB/BunchOfAs.txt',
+                       '4 files with Fingerprint ' +
+                       '0xfa75bf047f45891daee8f1fa4cd2bf58876770a5:',
+                       '    [rootA]/TreeA/DirA/LeafA/BunchOfBs.txt',
+                       '    [rootA]/LeafB/BunchOfBs.txt',
+                       '    [rootB]/TreeA/DirA/LeafA/BunchOfBs.txt',
+                       '    [rootB]/LeafB/BunchOfBs.txt',
+                       '2 files with Fingerprint ' +
+                       '0xb145bb8710c9b6624bb46631eecc3bbcc335d0ab:',
+                       '    [rootA]/BunchOfCs.txt',
+                       '    [rootB]/BunchOfCs.txt' ] ),
+                   ( ['--between', 'rootA/LeafB', 'rootA/TreeA'],
+                     [ header_a, '    [rootA]/TreeA/DirA/LeafA/BunchOfAs.txt',
+                       '    [rootA]/LeafB/BunchOfAs.txt',
+                       header_b, '    [rootA]/TreeA/DirA/LeafA/BunchOfBs.txt',
+                       '    [rootA]/LeafB/BunchOfBs.txt' ] ) ]
+        for (args, exp_out) in checks:
+            scr_out = subprocess.check_output([self.script_name, 
+                                               'dupe_files'] + args, 
+                                              universal_newlines=True)
+
+            # Verify results 
+            self.assertEqual( sorted(scr_out.splitlines()), sorted(exp_out) )
+
+        # Subtrees given to --between may not overlap
+        scr_out = subprocess.check_output([self.script_name, 'dupe_files',
+                                           '--between', 'rootA', 
+                                           'rootA/LeafB'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertTrue( 'overlap' in scr_out )
+
 # Allow unit test to run on its own
 if __name__ == '__main__':
     unittest.main()
@@ -22,6 +22,9 @@ import subprocess
 import unittest
 import datetime
 import time
+import shutil
+import hashlib
+import sqlite3
 
 from brd_unit_base import BrdUnitBase
 
@@ -38,6 +41,10 @@ class TestDupeTrees(BrdUnitBase):
         super(TestDupeTrees,self).setUp()
         
     def tearDown(self):
+        # Clean up test tree, if any
+        if os.path.exists('test_tree'):
+            shutil.rmtree('test_tree')
+
         # Call superclass's cleanup routine
         super(TestDupeTrees,self).tearDown()
 
@@ -424,6 +431,287 @@ class TestDupeTrees(BrdUnitBase):
         for exp_line in exp_out:
             self.assertTrue( exp_line in scr_lines )
 
+    def test_scope_options(self):
+        """Tests dupe_trees subcommand with --within and --between options.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+        leaf_fp = '0x183831bb75375e5a0fdd885c3b4425472519b7e9'
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with schema 1
+        self.populate_db_from_tree( 
+            self.get_schema_1( mod_time, check_time ) )
+        # Append another schema 1 with a new root name
+        self.populate_db_from_tree( 
+            self.get_schema_1( mod_time, check_time, 
+                               root_name = 'rootB', first_file_id=6,
+                               first_dir_id=6) )
+        self.conn.close()
+
+        # Each entry is (arguments, expected output)
+        checks = [ ( ['--within', 'rootA'], [] ),
+                   ( ['--between', 'rootA', 'rootB'],
+                     ['2 dirs with Fingerprint ' +
+                      '0xcab2b4fe2092da433a269238f82810b803c60917:',
+                      '    [rootA]', '    [rootB]'] ),
+                   ( ['--nodirname', '--within', 'rootA'],
+                     ['2 dirs with Fingerprint ' + leaf_fp + ':',
+                      '    [rootA]/TreeA/DirA/LeafA', '    [rootA]/LeafB'] ),
+                   ( ['--nodirname', '--between', 'rootA/TreeA', 
+                      'rootB/LeafB'],
+                     ['2 dirs with Fingerprint ' + leaf_fp + ':',
+                      '    [rootA]/TreeA/DirA/LeafA', '    [rootB]/LeafB'] ) ]
+        for (args, exp_out) in checks:
+            scr_out = subprocess.check_output([self.script_name, 
+                                               'dupe_trees'] + args, 
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+
+            # Verify results 
+            self.assertEqual( sorted(scr_out.splitlines()), sorted(exp_out) )
+
+    def test_jobs_option(self):
+        """Tests that dupe_trees reports the same duplicates whether
+        directories are fingerprinted by one or several processes.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with schema 1
+        self.populate_db_from_tree(
+            self.get_schema_1( mod_time, check_time ) )
+        # Append another schema 1 with a new root name
+        self.populate_db_from_tree(
+            self.get_schema_1( mod_time, check_time,
+                               root_name = 'rootB', first_file_id=6,
+                               first_dir_id=6) )
+        self.conn.close()
+
+        for args in [ [], ['--nodirname'], ['--nofilename', '--nofilefp'],
+                      ['--nodirname', '--between', 'rootA/TreeA',
+                       'rootB/LeafB'] ]:
+            exp_out = subprocess.check_output([self.script_name, 'dupe_trees',
+                                               '-j', '1'] + args,
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertNotEqual( exp_out, '' )
+            scr_out = subprocess.check_output([self.script_name, 'dupe_trees',
+                                               '-j', '3'] + args,
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertEqual( scr_out, exp_out )
+
+    def test_stored_fingerprints(self):
+        """Tests dupe_trees subcommand with the subtree fingerprints stored 
+        by scans, and that they follow changes.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build two copies of schema 1 and scan them
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        self.build_tree( self.get_schema_1( mod_time, check_time,
+                                            root_name = 'rootB' ) )
+        root_a = os.path.join('test_tree', 'rootA')
+        root_b = os.path.join('test_tree', 'rootB')
+        subprocess.check_output([self.script_name, 'scan', root_a, root_b],
+                                universal_newlines=True)
+
+        # Same fingerprint as calculated from scratch in test_identical_trees
+        scr_out = subprocess.check_output([self.script_name, 'dupe_trees'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( sorted(scr_out.splitlines()),
+                          sorted(['2 dirs with Fingerprint ' +
+                                  '0xcab2b4fe2092da433a269238f82810b803c60917:',
+                                  '    [' + root_a + ']', 
+                                  '    [' + root_b + ']']) )
+
+        # Change a file in one copy, which should only leave TreeA matching
+        with open( os.path.join( root_b, 'LeafB', 'BunchOfAs.txt' ), 
+                   'at' ) as f:
+            f.write( 'a' )
+        subprocess.check_output([self.script_name, 'scan', root_b],
+                                universal_newlines=True)
+        scr_out = subprocess.check_output([self.script_name, 'dupe_trees'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        scr_lines = scr_out.splitlines()
+        self.assertEqual( len(scr_lines), 3 )
+        self.assertEqual( sorted(scr_lines[1:]),
+                          [ '    [' + root_a + ']/TreeA', 
+                            '    [' + root_b + ']/TreeA' ] )
+
+        # Same result when fingerprinting from scratch
+        conn = brd.open_db( self.default_db )
+        conn.execute("UPDATE '" + self.table_names['dirs'] + "' SET " +
+                     "TreeFingerprint=NULL")
+        conn.commit()
+        conn.close()
+        scr_out = subprocess.check_output([self.script_name, 'dupe_trees'], 
+                                          universal_newlines=True)
+        self.assertEqual( sorted(scr_out.splitlines()), sorted(scr_lines) )
+
+    def test_tree_fp_order(self):
+        """Tests that the brd_tree_fp aggregate sorts its rows by kind and 
+        UTF-8 name itself, whatever order SQLite passes them in.
+        """
+
+        rows = [ (1, 'Sub', 'f' * 40), (0, '\u00e9t\u00e9.txt', 'e' * 40),
+                 (0, 'Zed.txt', 'd' * 40), (-1, 'Dir', None), 
+                 (0, 'apple.txt', None) ]
+        exp_fp = hashlib.sha1()
+        for (kind, name, fp) in [ rows[3], rows[2], rows[4], rows[1], 
+                                  rows[0] ]:
+            exp_fp.update( name.encode('utf8') )
+            if fp != None:
+                exp_fp.update( fp.encode('utf8') )
+
+        conn = sqlite3.connect(':memory:')
+        brd.register_db_functions( conn )
+        conn.execute("CREATE TABLE t (Seq INTEGER, Kind INTEGER, Name TEXT, " +
+                     "Fp TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?,?,?,?)", 
+                         [ (idx,) + row for (idx, row) in enumerate(rows) ])
+        for order in ( 'Seq', 'Seq DESC', 'Name DESC', 'Kind DESC' ):
+            got_fp = conn.execute("SELECT brd_tree_fp(Kind,Name,Fp) FROM " +
+                                  "(SELECT * FROM t ORDER BY " + order + 
+                                  ")").fetchone()[0]
+            self.assertEqual( got_fp, exp_fp.hexdigest() )
+        conn.close()
+
+    def get_dir_tree(self):
+        """Returns a DirTree of a root with four subdirectories, one of 
+        which has two of its own, in the form read by load_dir_tree().
+        """
+        return brd.DirTree( [ (1, 'root', -1, 0), (2, 'b', 1, 0), 
+                              (3, 'Z', 1, 0), (4, '\u00e9', 1, 0), 
+                              (5, 'a', 1, 0), (7, 'x', 4, 0), 
+                              (9, 'y', 4, 0) ] )
+
+    def test_dir_tree(self):
+        """Tests the layout of DirTree: indexes, parents, children sorted by
+        UTF-8 name and the traversal orders.
+        """
+
+        tree = self.get_dir_tree()
+        self.assertEqual( len(tree), 7 )
+        self.assertEqual( [ tree.index( dir_id ) for dir_id in 
+                            ( 0, 1, 2, 4, 6, 7, 9, 10 ) ],
+                          [ -1, 0, 1, 3, -1, 5, 6, -1 ] )
+        self.assertEqual( list(tree.parents), [ -1, 0, 0, 0, 0, 3, 3 ] )
+        self.assertEqual( tree.tops, { 0 : -1 } )
+        self.assertTrue( tree.is_root( 0 ) )
+        self.assertFalse( tree.is_root( 1 ) )
+
+        # Children are sorted by their UTF-8 encoded names.
+        self.assertEqual( list(tree.child_offsets), 
+                          [ 0, 4, 4, 4, 6, 6, 6, 6 ] )
+        self.assertEqual( [ tree.name( idx ) for idx in 
+                            tree.get_children( 0 ) ],
+                          [ b'Z', b'a', b'b', '\u00e9'.encode('utf8') ] )
+        self.assertEqual( list(tree.get_children( 3 )), [ 5, 6 ] )
+        self.assertEqual( list(tree.get_children( 5 )), [] )
+
+        (order, levels) = tree.top_down_order()
+        self.assertEqual( list(order), [ 0, 2, 4, 1, 3, 5, 6 ] )
+        self.assertEqual( list(levels), [ 0, 1, 5, 7 ] )
+
+        (starts, ends) = tree.subtree_ranges()
+        self.assertEqual( list(starts), [ 0, 3, 1, 4, 2, 5, 6 ] )
+        self.assertEqual( list(ends), [ 7, 4, 2, 7, 3, 6, 7 ] )
+
+    def test_dir_tree_scope(self):
+        """Tests that directories whose parents are outside the --within or
+        --between targets become tops of the DirTree.
+        """
+
+        tree = brd.DirTree( [ (5, 'A', 3, 1), (6, 'B', 5, 1), 
+                              (8, 'C', 4, 2), (9, 'D', 8, 2) ], True )
+        self.assertEqual( tree.tops, { 0 : 3, 2 : 4 } )
+        self.assertEqual( list(tree.parents), [ -1, 0, -1, 2 ] )
+        self.assertEqual( list(tree.scopes), [ 1, 1, 2, 2 ] )
+        self.assertFalse( tree.is_root( 0 ) )
+        self.assertEqual( list(tree.get_children( 0 )), [ 1 ] )
+        self.assertEqual( list(tree.get_children( 2 )), [ 3 ] )
+
+        (order, levels) = tree.top_down_order()
+        self.assertEqual( list(order), [ 0, 2, 1, 3 ] )
+        self.assertEqual( list(levels), [ 0, 2, 4 ] )
+
+    def test_dir_tree_same_digests(self):
+        """Tests that DirTree.iter_same_digests() groups equal digests in 
+        digest order, including digests that share a bucket but differ.
+        """
+
+        tree = self.get_dir_tree()
+        digests = [ b'\x12\x34' + b'\x00' * 18, b'\x12\x34' + b'\x01' * 18,
+                    b'\x12\x34' + b'\x00' * 18, b'\x12\x34' + b'\x02' * 18,
+                    b'\x12\x34' + b'\x01' * 18, b'\x00\x01' + b'\xff' * 18,
+                    b'\x00\x01' + b'\xff' * 18 ]
+        for (idx, digest) in enumerate(digests):
+            tree.set_digest( idx, digest )
+        self.assertEqual( list(tree.iter_same_digests()), 
+                          [ [ 5, 6 ], [ 0, 2 ], [ 1, 4 ] ] )
+
+        # No groups once every digest is different.
+        tree.set_digest( 2, b'\x12\x35' + b'\x00' * 18 )
+        tree.set_digest( 4, b'\x12\x33' + b'\x01' * 18 )
+        tree.set_digest( 6, b'\x00\x02' + b'\xff' * 18 )
+        self.assertEqual( list(tree.iter_same_digests()), [] )
+
+    @unittest.skipIf( brd.shared_memory == None, 
+                      'multiprocessing.shared_memory is not available' )
+    def test_dir_tree_share(self):
+        """Tests that DirTree.unshare() restores the columns moved into shared
+        memory by DirTree.share(), keeping digests written in the meantime.
+        """
+
+        tree = self.get_dir_tree()
+        tree.set_digest( 1, b'\xab' * 20 )
+        before = dict( [ (col, bytes( getattr(tree, col) )) 
+                         for col in brd.DirTree.shared_cols ] )
+
+        spec = tree.share()
+        try:
+            self.assertEqual( sorted(spec['columns'].keys()), 
+                              sorted(brd.DirTree.shared_cols) )
+            for col in brd.DirTree.shared_cols:
+                self.assertTrue( isinstance( getattr(tree, col), memoryview ) )
+                self.assertEqual( bytes( getattr(tree, col) ), before[ col ] )
+
+            # Digests written through an attached copy are seen by the tree.
+            worker = brd.DirTree.attach( spec )
+            worker.set_digest( 3, b'\xcd' * 20 )
+            self.assertEqual( list(worker.get_children( 0 )), [ 2, 4, 1, 3 ] )
+            for col in brd.DirTree.shared_cols:
+                getattr(worker, col).release()
+            for block in worker.blocks:
+                block.close()
+        finally:
+            tree.unshare()
+
+        self.assertEqual( tree.blocks, [] )
+        self.assertEqual( tree.digest( 1 ), b'\xab' * 20 )
+        self.assertEqual( tree.digest( 3 ), b'\xcd' * 20 )
+        before['digests'] = bytes( tree.digests )
+        for col in brd.DirTree.shared_cols:
+            data = getattr(tree, col)
+            self.assertFalse( isinstance( data, memoryview ) )
+            self.assertEqual( bytes( data ), before[ col ] )
+        self.assertEqual( [ tree.name( idx ) for idx in 
+                            tree.get_children( 0 ) ],
+                          [ b'Z', b'a', b'b', '\u00e9'.encode('utf8') ] )
+
 # Allow unit test to run on its own
 if __name__ == '__main__':
     unittest.main()
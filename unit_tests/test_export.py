@@ -0,0 +1,112 @@
+#    brd - scans directories and files for damage due to decay of medium.
+#    Copyright (C) 2013 Jeff Backus <jeff.backus@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import unittest
+import datetime
+import time
+import json
+
+from brd_unit_base import BrdUnitBase
+
+# Import brd in order to use some of its functions
+# Note: we're expecting brd_unit_base to take care of path stuff
+import brd
+
+class TestExport(BrdUnitBase):
+    """Unit tests for the export subcommand.
+    """
+
+    def setUp(self):
+        # Call superclass's setup routine.
+        super(TestExport,self).setUp()
+        
+    def tearDown(self):
+        # Call superclass's cleanup routine
+        super(TestExport,self).tearDown()
+
+    def test_all_roots(self):
+        """Tests export subcommand in sha1sum format without any targets.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with schema 1.
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.populate_db_from_tree( exp_data )
+        self.conn.close()
+
+        scr_out = subprocess.check_output([self.script_name, 'export'], 
+                                          universal_newlines=True)
+
+        fp_a = '1a0372738bb5b4b8360b47c4504a27e6f4811493'
+        fp_b = 'fa75bf047f45891daee8f1fa4cd2bf58876770a5'
+        fp_c = 'b145bb8710c9b6624bb46631eecc3bbcc335d0ab'
+        exp_lines = [ fp_c + '  ' + os.path.join('rootA', 'BunchOfCs.txt'),
+                      fp_a + '  ' + os.path.join('rootA', 'LeafB', 
+                                                 'BunchOfAs.txt'),
+                      fp_b + '  ' + os.path.join('rootA', 'LeafB', 
+                                                 'BunchOfBs.txt'),
+                      fp_a + '  ' + os.path.join('rootA', 'TreeA', 'DirA', 
+                                                 'LeafA', 'BunchOfAs.txt'),
+                      fp_b + '  ' + os.path.join('rootA', 'TreeA', 'DirA', 
+                                                 'LeafA', 'BunchOfBs.txt') ]
+
+        # Verify results
+        self.assertEqual( sorted( scr_out.splitlines() ), sorted( exp_lines ) )
+
+    def test_relative_jsonl(self):
+        """Tests export subcommand in JSONL format with a subtree target and
+        --relative.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with schema 1.
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.populate_db_from_tree( exp_data )
+        self.conn.close()
+
+        scr_out = subprocess.check_output([self.script_name, 'export', 
+                                           '--format', 'jsonl', '--relative',
+                                           'rootA/TreeA'], 
+                                          universal_newlines=True)
+
+        records = [ json.loads( line ) for line in scr_out.splitlines() ]
+        got_paths = sorted( [ record['path'] for record in records ] )
+        exp_paths = [ os.path.join('DirA', 'LeafA', 'BunchOfAs.txt'),
+                      os.path.join('DirA', 'LeafA', 'BunchOfBs.txt') ]
+
+        # Verify results
+        self.assertEqual( got_paths, exp_paths )
+        for record in records:
+            self.assertEqual( record['size'], 257 )
+
+# Allow unit test to run on its own
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+#    brd - scans directories and files for damage due to decay of medium.
+#    Copyright (C) 2013 Jeff Backus <jeff.backus@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import unittest
+import datetime
+import time
+import shutil
+
+from brd_unit_base import BrdUnitBase
+
+# Import brd in order to use some of its functions
+# Note: we're expecting brd_unit_base to take care of path stuff
+import brd
+
+class TestImport(BrdUnitBase):
+    """Unit tests for the import subcommand.
+    """
+
+    def setUp(self):
+        # Call superclass's setup routine.
+        super(TestImport,self).setUp()
+
+        # Define manifest name
+        self.manifest = 'test_manifest.sha1'
+        
+    def tearDown(self):
+        # Clean up test tree and manifest
+        shutil.rmtree('test_tree')
+        if os.path.exists( self.manifest ):
+            os.unlink( self.manifest )
+
+        # Call superclass's cleanup routine
+        super(TestImport,self).tearDown()
+
+    def write_manifest(self, root_name, file_names):
+        """Writes a sha1sum manifest of the specified files, which are 
+        relative to root_name.
+        """
+
+        with open( self.manifest, 'wt' ) as f:
+            for file_name in file_names:
+                fp = self.calc_fingerprint( os.path.join( root_name, 
+                                                          file_name ) )
+                f.write( fp + '  ' + file_name + '\n' )
+
+    def test_sha1sum(self):
+        """Tests import subcommand with a sha1sum manifest, followed by a scan
+        of the imported tree.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+
+        root_name = os.path.join('test_tree', 'rootA')
+        file_names = [ 'BunchOfCs.txt', os.path.join('LeafB', 'BunchOfAs.txt'),
+                       os.path.join('TreeA', 'DirA', 'LeafA', 
+                                    'BunchOfBs.txt') ]
+        self.write_manifest( root_name, file_names )
+
+        scr_out = subprocess.check_output([self.script_name, 'import', 
+                                           root_name, self.manifest],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        # Verify that the files were added without sizes.
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT Name,Size FROM '" + self.table_names['files'] +
+                       "' ORDER BY File_ID")
+        got_rows = cursor.fetchall()
+        self.conn.close()
+        self.assertEqual( got_rows, [ ('BunchOfCs.txt', None),
+                                      ('BunchOfAs.txt', None),
+                                      ('BunchOfBs.txt', None) ] )
+
+        # Scanning should find the imported files intact and fill in sizes.
+        scr_out = subprocess.check_output([self.script_name, 'scan', 
+                                           root_name],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM '" + self.table_names['files'] + 
+                       "' WHERE Size IS NULL")
+        self.assertEqual( cursor.fetchone()[0], 0 )
+        self.conn.close()
+
+    def test_damaged_file(self):
+        """Tests that a file that doesn't match an imported manifest is 
+        reported as damaged.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+
+        root_name = os.path.join('test_tree', 'rootA')
+        self.write_manifest( root_name, [ 'BunchOfCs.txt' ] )
+
+        subprocess.check_output([self.script_name, 'import', root_name, 
+                                 self.manifest], universal_newlines=True)
+
+        # Damage the file, keeping its modification time.
+        file_name = os.path.join( root_name, 'BunchOfCs.txt' )
+        with open( file_name, 'wt' ) as f:
+            f.write( 'd' * 256 + os.linesep )
+        tmp_time = mod_time.timestamp()
+        os.utime( file_name, ( tmp_time, tmp_time ) )
+
+        scr_out = subprocess.check_output([self.script_name, 'scan', 
+                                           root_name],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+
+        # Verify results
+        self.assertTrue( 0 <= scr_out.find( 'File could be damaged!' ) )
+
+    def test_replace(self):
+        """Tests that files listed more than once or already in the database
+        are skipped, or updated with --replace, and that updates keep the
+        root's digest and the change journal in step.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+
+        root_name = os.path.join('test_tree', 'rootA')
+        file_b = os.path.join('LeafB', 'BunchOfAs.txt')
+        fp_a = self.calc_fingerprint( os.path.join( root_name, 
+                                                    'BunchOfCs.txt' ) )
+        fp_b = self.calc_fingerprint( os.path.join( root_name, file_b ) )
+        bad_fp = '0' * 40
+        with open( self.manifest, 'wt' ) as f:
+            f.write( bad_fp + '  BunchOfCs.txt\n' )
+            f.write( fp_b + '  ' + file_b + '\n' )
+            f.write( fp_a + '  BunchOfCs.txt\n' )
+
+        def get_fps():
+            self.open_db( self.default_db, True )
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT Name,Fingerprint FROM '" + 
+                           self.table_names['files'] + "' ORDER BY File_ID")
+            got_rows = cursor.fetchall()
+            self.conn.close()
+            return got_rows
+
+        # Without --replace, the first entry for a file wins.
+        scr_out = subprocess.check_output([self.script_name, '-v', 'import', 
+                                           root_name, self.manifest],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertTrue( 0 <= scr_out.find( 
+            'Imported files: 2 added, 0 updated, 1 skipped' ) )
+        self.assertEqual( get_fps(), [ ('BunchOfCs.txt', bad_fp),
+                                       ('BunchOfAs.txt', fp_b) ] )
+
+        scr_out = subprocess.check_output([self.script_name, '-v', 'import', 
+                                           root_name, self.manifest],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertTrue( 0 <= scr_out.find( 
+            'Imported files: 0 added, 0 updated, 3 skipped' ) )
+        self.assertEqual( get_fps(), [ ('BunchOfCs.txt', bad_fp),
+                                       ('BunchOfAs.txt', fp_b) ] )
+
+        # With --replace, the last one does.
+        scr_out = subprocess.check_output([self.script_name, '-v', 'import', 
+                                           '--replace', root_name, 
+                                           self.manifest],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertTrue( 0 <= scr_out.find( 
+            'Imported files: 0 added, 3 updated, 0 skipped' ) )
+        self.assertEqual( get_fps(), [ ('BunchOfCs.txt', fp_a),
+                                       ('BunchOfAs.txt', fp_b) ] )
+
+        # The root's digest should still match its records.
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--rows'],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        scr_out = subprocess.check_output([self.script_name, 'changes'],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        lines = scr_out.splitlines()
+        self.assertEqual( len(lines), 8 )
+        self.assertEqual( lines[-2:], 
+            [ "    Updated file '" + os.path.join( root_name, 'BunchOfCs.txt' ) +
+              "' (" + bad_fp + ' -> ' + fp_a + ')',
+              "    Updated file '" + os.path.join( root_name, file_b ) + 
+              "' (" + fp_b + ' -> ' + fp_b + ')' ] )
+
+# Allow unit test to run on its own
+if __name__ == '__main__':
+    unittest.main()
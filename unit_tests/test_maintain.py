@@ -0,0 +1,117 @@
+#    brd - scans directories and files for damage due to decay of medium.
+#    Copyright (C) 2013 Jeff Backus <jeff.backus@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import unittest
+import datetime
+import time
+
+from brd_unit_base import BrdUnitBase
+
+# Import brd in order to use some of its functions
+# Note: we're expecting brd_unit_base to take care of path stuff
+import brd
+
+class TestMaintain(BrdUnitBase):
+    """Unit tests for the maintain subcommand.
+    """
+
+    def setUp(self):
+        # Call superclass's setup routine.
+        super(TestMaintain,self).setUp()
+        
+    def tearDown(self):
+        # Call superclass's cleanup routine
+        super(TestMaintain,self).tearDown()
+
+    def test_stats_only(self):
+        """Tests maintain subcommand with --stats-only.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with schema 1.
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.populate_db_from_tree( exp_data )
+        self.conn.close()
+
+        db_size = os.path.getsize( self.default_db )
+
+        scr_out = subprocess.check_output([self.script_name, 'maintain', 
+                                           '--stats-only'], 
+                                          universal_newlines=True)
+
+        # Verify results
+        self.assertTrue( 0 <= scr_out.find( '[Database]' ) )
+        self.assertTrue( 0 <= scr_out.find( '    Free Pages: 0 (0.0%)' ) )
+        self.assertTrue( 0 <= scr_out.find( '    ' + 
+                                            self.table_names['files'] + 
+                                            ': 5 rows' ) )
+        self.assertTrue( 0 <= scr_out.find( '    ' + 
+                                            self.table_names['dirs'] + 
+                                            ': 5 rows' ) )
+        self.assertEqual( db_size, os.path.getsize( self.default_db ) )
+
+    def test_incremental(self):
+        """Tests maintain subcommand with --incremental after removing a 
+        large number of records.
+        """
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Fill the database with enough records to span many pages.
+        cursor = self.conn.cursor()
+        cursor.executemany("INSERT INTO '" + self.table_names['files'] + 
+                           "' (Name, Parent_ID, Fingerprint, Size) " +
+                           "VALUES (?,?,?,?)", 
+                           [ ('file' + str(i), 1, 'a' * 40, i) 
+                             for i in range(5000) ])
+        self.conn.commit()
+        cursor.execute("DELETE FROM '" + self.table_names['files'] + "'")
+        self.conn.commit()
+        cursor.execute("PRAGMA freelist_count")
+        free_pages = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_count")
+        start_pages = cursor.fetchone()[0]
+        self.conn.close()
+
+        self.assertNotEqual( free_pages, 0 )
+
+        scr_out = subprocess.check_output([self.script_name, 'maintain', 
+                                           '--incremental'], 
+                                          universal_newlines=True)
+
+        # Verify results
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA freelist_count")
+        self.assertEqual( cursor.fetchone()[0], 0 )
+        cursor.execute("PRAGMA page_count")
+        self.assertEqual( cursor.fetchone()[0], start_pages - free_pages )
+        self.conn.close()
+
+# Allow unit test to run on its own
+if __name__ == '__main__':
+    unittest.main()
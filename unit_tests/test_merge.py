@@ -0,0 +1,204 @@
+#    brd - scans directories and files for damage due to decay of medium.
+#    Copyright (C) 2013 Jeff Backus <jeff.backus@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import unittest
+import datetime
+import time
+
+from brd_unit_base import BrdUnitBase
+
+# Import brd in order to use some of its functions
+# Note: we're expecting brd_unit_base to take care of path stuff
+import brd
+
+class TestMerge(BrdUnitBase):
+    """Unit tests for the merge subcommand.
+    """
+
+    def setUp(self):
+        # Call superclass's setup routine.
+        super(TestMerge,self).setUp()
+
+        # Define source database name
+        self.source_db = 'test_source.db'
+        self.remove_db( self.source_db )
+        
+    def tearDown(self):
+        # Clean up source database
+        self.remove_db( self.source_db )
+
+        # Call superclass's cleanup routine
+        super(TestMerge,self).tearDown()
+
+    def populate_dbs(self, mod_time, check_time):
+        """Populates the default database with schema 1 and the source
+        database with schemas 1 and 2. Returns the expected data of the 
+        source database.
+        """
+
+        self.open_db( self.default_db, False )
+        self.populate_db_from_tree( self.get_schema_1( mod_time, check_time ) )
+        self.conn.close()
+
+        src_data = self.get_schema_1( mod_time, check_time )
+        src_data['roots'].update( 
+            self.get_schema_2( mod_time, check_time )['roots'] )
+        self.open_db( self.source_db, False )
+        self.populate_db_from_tree( src_data )
+        self.conn.close()
+
+        return src_data
+
+    def get_cur_data(self):
+        """Returns the contents of the default database, without IDs.
+        """
+
+        self.open_db( self.default_db, True )
+        cur_data = self.build_tree_data_from_db( self.conn.cursor() )
+        self.conn.close()
+
+        return self.strip_fields( cur_data, [ 'Name', 'contents', 'Path_ID',
+                                              'Parent_ID', 'File_ID' ] )
+
+    def test_rename(self):
+        """Tests merge subcommand with the default conflict policy, which 
+        renames conflicting roots.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        src_data = self.populate_dbs( mod_time, check_time )
+
+        scr_out = subprocess.check_output([self.script_name, 'merge', 
+                                           self.source_db], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        # Build expected contents
+        exp_data = self.get_schema_1( mod_time, check_time )
+        exp_data['roots']['rootB'] = src_data['roots']['rootB']
+        exp_data['roots']['rootA@test_source'] = src_data['roots']['rootA']
+        exp_data = self.strip_fields( exp_data, [ 'Name', 'contents', 
+                                                  'Path_ID', 'Parent_ID', 
+                                                  'File_ID' ] )
+
+        diff_results = self.diff_trees( exp_data, self.get_cur_data() )
+
+        # Verify results
+        self.assertEqual( diff_results['left'], None)
+        self.assertEqual( diff_results['right'], None)
+
+        # Copied records should have valid checksums and digests.
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--rows'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+    def test_skip(self):
+        """Tests merge subcommand with conflicting roots being skipped.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        src_data = self.populate_dbs( mod_time, check_time )
+
+        scr_out = subprocess.check_output([self.script_name, 'merge', 
+                                           '--on-conflict', 'skip',
+                                           self.source_db], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertTrue( 0 <= scr_out.find( "Root 'rootA' from '" + 
+                                            self.source_db + "' is already " +
+                                            "in the database. Skipping." ) )
+
+        # Build expected contents
+        exp_data = self.get_schema_1( mod_time, check_time )
+        exp_data['roots']['rootB'] = src_data['roots']['rootB']
+        exp_data = self.strip_fields( exp_data, [ 'Name', 'contents', 
+                                                  'Path_ID', 'Parent_ID', 
+                                                  'File_ID' ] )
+
+        diff_results = self.diff_trees( exp_data, self.get_cur_data() )
+
+        # Verify results
+        self.assertEqual( diff_results['left'], None)
+        self.assertEqual( diff_results['right'], None)
+
+    def test_replace(self):
+        """Tests merge subcommand with conflicting roots being replaced, which
+        must not reuse the IDs of the rows that were removed.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        src_data = self.populate_dbs( mod_time, check_time )
+
+        def get_ids():
+            self.open_db( self.default_db, True )
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT Path_ID FROM '" + self.table_names['dirs'] +
+                           "'")
+            dir_ids = set([ row[0] for row in cursor.fetchall() ])
+            cursor.execute("SELECT File_ID FROM '" + 
+                           self.table_names['files'] + "'")
+            file_ids = set([ row[0] for row in cursor.fetchall() ])
+            self.conn.close()
+            return (dir_ids, file_ids)
+
+        (old_dir_ids, old_file_ids) = get_ids()
+
+        scr_out = subprocess.check_output([self.script_name, 'merge', 
+                                           '--on-conflict', 'replace',
+                                           self.source_db], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        # Build expected contents
+        exp_data = self.strip_fields( src_data, [ 'Name', 'contents', 
+                                                  'Path_ID', 'Parent_ID', 
+                                                  'File_ID' ] )
+
+        diff_results = self.diff_trees( exp_data, self.get_cur_data() )
+
+        # Verify results
+        self.assertEqual( diff_results['left'], None)
+        self.assertEqual( diff_results['right'], None)
+
+        (new_dir_ids, new_file_ids) = get_ids()
+        self.assertEqual( new_dir_ids & old_dir_ids, set() )
+        self.assertEqual( new_file_ids & old_file_ids, set() )
+
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--rows'], 
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+# Allow unit test to run on its own
+if __name__ == '__main__':
+    unittest.main()
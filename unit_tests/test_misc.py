@@ -19,6 +19,11 @@ from __future__ import unicode_literals
 
 import unittest
 import os
+import sys
+import subprocess
+import shutil
+import datetime
+import time
 
 from brd_unit_base import BrdUnitBase
 
@@ -45,6 +50,31 @@ class TestMisc(BrdUnitBase):
         for entry in table_names.keys():
             self.assertEqual( brd.table_names[entry], table_names[entry] )
 
+    def test_interpreter(self):
+        """Verifies that brd runs under the interpreter running the tests,
+        without anything on PYTHONPATH to fill in for missing modules or
+        functions.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        env = dict(os.environ)
+        env.pop('PYTHONPATH', None)
+
+        self.build_tree( self.get_schema_1( mod_time, mod_time ) )
+        try:
+            for args in [ ['-v', 'scan', os.path.join('test_tree', 'rootA')],
+                          ['-v', 'dupe_trees', '--nodirname', '-j', '2'] ]:
+                proc = subprocess.Popen([sys.executable, self.script_name] +
+                                        args, env=env, 
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        universal_newlines=True)
+                scr_out = proc.communicate()[0]
+                self.assertEqual( proc.returncode, 0, scr_out )
+                self.assertFalse( 'Traceback' in scr_out, scr_out )
+        finally:
+            shutil.rmtree('test_tree')
+
     def test_create_db(self):
         """Verifies that open_db() will create a new database with the 
         proper table names.
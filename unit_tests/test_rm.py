@@ -365,7 +365,39 @@ class TestRm(BrdUnitBase):
         self.assertEqual( diff_results['left'], None)
         self.assertEqual( diff_results['right'], None)
         self.assertNotEqual( len( diff_results['common']['roots'] ), 0)
-        
+
+    def test_dry_run_counts(self):
+        """Tests that rm --dry-run reports the number of files and directories
+        in the subtree that would be removed.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        exp_out = ["    Files: 2", "    Directories: 3",
+                   "Subdirectory 'LeafA' would be pruned from directory " +
+                   "'rootA/TreeA/DirA'.",
+                   "File 'BunchOfBs.txt' would be pruned from directory " +
+                   "'rootA/TreeA/DirA/LeafA'."]
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Populate the database with schema 1.
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.populate_db_from_tree( exp_data )
+        self.conn.close()
+
+        # Simulate removing target subtree.
+        scr_out = subprocess.check_output([self.script_name, '-v', 'rm',
+                                           '--dry-run', 'rootA/TreeA'],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+
+        # Verify results
+        for exp_line in exp_out:
+            self.assertNotEqual( scr_out.find( exp_line ), -1 )
+
     def test_invalid_target(self):
         """Tests rm subcommand with an invalid target.
         """
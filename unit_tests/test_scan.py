@@ -23,6 +23,11 @@ import unittest
 import datetime
 import time
 import shutil
+import socket
+import sys
+import hashlib
+import threading
+import sqlite3
 
 from brd_unit_base import BrdUnitBase
 
@@ -408,6 +413,488 @@ class TestScan(BrdUnitBase):
         self.assertEqual( results['right'], None )
         self.assertNotEqual( len(results['common']), 0 )
 
+    def test_absolute_root(self):
+        """Tests scan subcommand with an absolute path to an existing root.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+
+        # Scan the same absolute target twice
+        target_name = os.path.abspath(os.path.join('test_tree', 'rootA'))
+        for idx in range(2):
+            scr_out = subprocess.check_output([self.script_name, 'scan',
+                                               target_name],
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True,
+                                              timeout=60)
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Get contents of database
+        got_data = self.build_tree_data_from_db( self.conn.cursor() )
+        self.conn.close()
+
+        # Verify that the second scan reused the root
+        self.assertEqual( list(got_data['roots'].keys()), [ target_name ] )
+
+    def test_in_memory(self):
+        """Tests scan subcommand with a single new root and --db-in-memory.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+
+        # Check targets
+        target_name = os.path.join('test_tree', 'rootA')
+        scr_out = subprocess.check_output([self.script_name, '--db-in-memory',
+                                           'scan', target_name],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+        # Call open_db, which should create db and its tables
+        self.open_db( self.default_db, False )
+
+        # Get contents of database
+        cursor = self.conn.cursor()
+        got_data = self.build_tree_data_from_db( cursor )
+
+        # Verify that no leases were left behind
+        cursor.execute("SELECT COUNT(*) FROM '" + self.table_names['leases'] +
+                       "'")
+        self.assertEqual( cursor.fetchone()[0], 0 )
+        self.conn.close()
+
+        # Remove contents and ID fields and compare
+        exp_data = self.strip_fields(exp_data, ["contents","File_ID",
+                                                "Parent_ID","Path_ID"])
+        got_data = self.strip_fields(got_data, ["contents","File_ID",
+                                                "Parent_ID","Path_ID"])
+        got_data['roots'][target_name]['Name'] = 'rootA'
+        results = self.diff_trees( exp_data['roots']['rootA'],
+                                   got_data['roots'][target_name] )
+
+        # Verify results
+        self.assertEqual( results['left'], None )
+        self.assertEqual( results['right'], None )
+        self.assertNotEqual( len(results['common']), 0 )
+
+    def test_missing(self):
+        """Tests scan subcommand with files and directories that were removed
+        since the last scan, without --prune.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+        target_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+
+        # Remove a file and a subdirectory, then rescan twice.
+        os.unlink( os.path.join( target_name, 'BunchOfCs.txt' ) )
+        shutil.rmtree( os.path.join( target_name, 'LeafB' ) )
+        for idx in range(2):
+            scr_out = subprocess.check_output([self.script_name, 'scan', 
+                                               target_name],
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+
+            # Verify results
+            self.assertTrue( 0 <= scr_out.find( "File 'BunchOfCs.txt' no " +
+                                                "longer exists in directory '"
+                                                + target_name + "'!" ) )
+            self.assertTrue( 0 <= scr_out.find( "Subdirectory 'LeafB' no " +
+                                                "longer exists in directory '"
+                                                + target_name + "'!" ) )
+            self.assertTrue( 0 <= scr_out.find( "File 'BunchOfAs.txt' no " +
+                                                "longer exists in directory '"
+                                                + os.path.join( target_name,
+                                                                'LeafB' ) +
+                                                "'!" ) )
+            self.assertEqual( scr_out.count( 'no longer exists' ), 4 )
+
+        # Nothing should have been removed from the database.
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM '" + self.table_names['files'] +
+                       "'")
+        self.assertEqual( cursor.fetchone()[0], 5 )
+        self.conn.close()
+
+    def test_moves(self):
+        """Tests that files and directories that were moved or renamed keep
+        their database entries, unless --no-moves is specified.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+        target_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+
+        # Rename a directory and move a file into it.
+        os.rename( os.path.join( target_name, 'TreeA', 'DirA', 'LeafA' ),
+                   os.path.join( target_name, 'TreeA', 'DirA', 'LeafZ' ) )
+        os.rename( os.path.join( target_name, 'BunchOfCs.txt' ),
+                   os.path.join( target_name, 'TreeA', 'DirA', 'LeafZ', 
+                                 'Cs.txt' ) )
+
+        query = "SELECT d.Path_ID,d.Name,f.File_ID,f.Name FROM fp_dirs d " + \
+            "JOIN fp_files f ON f.Parent_ID=d.Path_ID WHERE f.Name LIKE " + \
+            "'%Cs.txt' OR d.Name IN ('LeafA','LeafZ') ORDER BY f.Name"
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute( query )
+        before = cursor.fetchall()
+        self.conn.close()
+
+        for (options, moved) in ( ( [], True ), ( ['--no-moves'], False ) ):
+            if not moved:
+                os.rename( os.path.join( target_name, 'TreeA', 'DirA', 
+                                         'LeafZ' ),
+                           os.path.join( target_name, 'TreeA', 'DirA', 
+                                         'LeafA' ) )
+            scr_out = subprocess.check_output([self.script_name, '-v', 'scan',
+                                               '-p'] + options + 
+                                              [target_name],
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+
+            self.open_db( self.default_db, True )
+            cursor = self.conn.cursor()
+            cursor.execute( query )
+            after = cursor.fetchall()
+            self.conn.close()
+
+            # Verify results
+            self.assertEqual( scr_out.count( 'was moved to' ), 
+                              2 if moved else 0 )
+            self.assertEqual( scr_out.count( 'pruned from directory' ) == 0, 
+                              moved )
+            self.assertEqual( len( after ), 3 )
+            if moved:
+                self.assertEqual( [ row[0] for row in after ],
+                                  [ before[0][0] ] * 3 )
+                self.assertEqual( sorted( [ row[2] for row in after ] ),
+                                  sorted( [ row[2] for row in before ] ) )
+                self.assertEqual( after[0][1], 'LeafZ' )
+                self.assertEqual( after[2][3], 'Cs.txt' )
+
+                # The changes are listed with the new paths.
+                scr_out = subprocess.check_output([self.script_name,
+                                                   'changes'],
+                                                  universal_newlines=True)
+                leaf_z = os.path.join( target_name, 'TreeA', 'DirA',
+                                       'LeafZ' )
+                self.assertEqual( sorted( scr_out.splitlines()[-2:] ),
+                                  [ "    Moved directory '" + leaf_z + "'",
+                                    "    Moved file '" +
+                                    os.path.join( leaf_z, 'Cs.txt' ) + "'" ] )
+            else:
+                self.assertNotEqual( after[0][0], before[0][0] )
+                self.assertEqual( after[0][1], 'LeafA' )
+
+        scr_out = subprocess.check_output([self.script_name, 'checkdb', 
+                                           '--rows'],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertEqual( scr_out, '' )
+
+    def get_new_files(self):
+        """Returns the sorted names of the directories that hold a file named
+        New.txt in the database.
+        """
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT d.Name FROM fp_files f JOIN fp_dirs d ON " +
+                       "d.Path_ID=f.Parent_ID WHERE f.Name='New.txt' " +
+                       "ORDER BY d.Name")
+        ret_val = [ row[0] for row in cursor.fetchall() ]
+        self.conn.close()
+        return ret_val
+
+    def test_leases(self):
+        """Tests that scan skips roots leased by other processes, takes over
+        leases of processes that no longer exist, and that the report 
+        subcommands open the database read-only and leave it untouched.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build and scan two copies of schema 1, then add a file to each.
+        roots = [ os.path.join('test_tree', 'rootA'),
+                  os.path.join('test_tree', 'rootB') ]
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        self.build_tree( self.get_schema_1( mod_time, check_time,
+                                            root_name = 'rootB' ) )
+        subprocess.check_output([self.script_name, 'scan'] + roots,
+                                universal_newlines=True)
+        for root in roots:
+            with open( os.path.join( root, 'New.txt' ), 'wt' ) as f:
+                f.write( 'new' )
+
+        # Lease rootA to this process, which is alive.
+        self.open_db( self.default_db, False )
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT Path_ID FROM fp_dirs WHERE Parent_ID=-1 AND " +
+                       "Name=?", (roots[0],))
+        root_id = cursor.fetchone()[0]
+        cursor.execute("INSERT INTO fp_leases (Root_ID,Host,PID,Expires) " +
+                       "VALUES (?,?,?,?)", (root_id, socket.gethostname(),
+                                            os.getpid(), time.time() + 3600))
+        self.conn.commit()
+        self.conn.close()
+
+        # rootA is skipped, while rootB is scanned.
+        scr_out = subprocess.check_output([self.script_name, 'scan'] + roots,
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertTrue( "Root '" + roots[0] + "' is being modified by " +
+                         "process " + str(os.getpid()) in scr_out )
+        self.assertEqual( self.get_new_files(), [ roots[1] ] )
+
+        # Hand the lease to a process that has exited, so it's taken over
+        # and released once the scan is done.
+        proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+        proc.wait()
+        self.open_db( self.default_db, False )
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE fp_leases SET PID=?", (proc.pid,))
+        self.conn.commit()
+        self.conn.close()
+        scr_out = subprocess.check_output([self.script_name, 'scan', 
+                                           roots[0]],
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        self.assertFalse( 'is being modified' in scr_out )
+        self.assertEqual( self.get_new_files(), roots )
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM fp_leases")
+        self.assertEqual( cursor.fetchone()[0], 0 )
+        self.conn.close()
+
+        # Report subcommands don't modify the database.
+        with open( self.default_db, 'rb' ) as f:
+            exp_digest = hashlib.sha1( f.read() ).hexdigest()
+        for args in [ ['list'], ['dupe_files'], ['dupe_trees'], 
+                      ['similar_trees'], ['diff'] + roots, ['du'], 
+                      ['export'], ['changes'] ]:
+            scr_out = subprocess.check_output([self.script_name, '-d'] + 
+                                              args,
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertTrue( '?mode=ro' in scr_out, args )
+            with open( self.default_db, 'rb' ) as f:
+                self.assertEqual( hashlib.sha1( f.read() ).hexdigest(),
+                                  exp_digest, args )
+
+    def test_busy(self):
+        """Tests that scan waits for another connection to release the write
+        lock.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        target_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+        with open( os.path.join( target_name, 'New.txt' ), 'wt' ) as f:
+            f.write( 'new' )
+
+        # Hold the write lock for a second while the scan starts.
+        lock_conn = sqlite3.connect( self.default_db, isolation_level=None,
+                                     check_same_thread=False )
+        lock_conn.execute("BEGIN IMMEDIATE")
+        timer = threading.Timer( 1.0, lock_conn.execute, ["COMMIT"] )
+        timer.start()
+        try:
+            start = time.time()
+            subprocess.check_output([self.script_name, '--busy-timeout', 
+                                     '30', 'scan', target_name],
+                                    stderr=subprocess.STDOUT,
+                                    universal_newlines=True)
+            self.assertTrue( 1.0 <= time.time() - start )
+        finally:
+            timer.join()
+            lock_conn.close()
+        self.assertEqual( self.get_new_files(), [ target_name ] )
+
+    def test_busy_timeout(self):
+        """Tests that commands skip their targets with an error, instead of 
+        crashing, when another connection holds the write lock for longer 
+        than --busy-timeout.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        self.build_tree( self.get_schema_1( mod_time, check_time ) )
+        target_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+        with open( os.path.join( target_name, 'New.txt' ), 'wt' ) as f:
+            f.write( 'new' )
+        other_name = os.path.join('test_tree', 'rootB')
+
+        lock_conn = sqlite3.connect( self.default_db, isolation_level=None )
+        lock_conn.execute("BEGIN IMMEDIATE")
+        try:
+            scr_out = subprocess.check_output([self.script_name, 
+                                               '--busy-timeout', '1', 'scan',
+                                               target_name, other_name],
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertTrue( scr_out.find( 'Traceback' ) < 0 )
+            for name in ( target_name, other_name ):
+                self.assertTrue( 0 <= scr_out.find( 
+                    "Database is busy. Skipping target '" + name + "'." ) )
+
+            scr_out = subprocess.check_output([self.script_name, 
+                                               '--busy-timeout', '1', 'rm',
+                                               target_name],
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertTrue( scr_out.find( 'Traceback' ) < 0 )
+            self.assertTrue( 0 <= scr_out.find( 
+                "Database is busy. Skipping target(s) '['" + target_name + 
+                "']'." ) )
+
+            scr_out = subprocess.check_output([self.script_name, 
+                                               '--busy-timeout', '1', 
+                                               'import', other_name, '-'],
+                                              stdin=subprocess.DEVNULL,
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+            self.assertTrue( scr_out.find( 'Traceback' ) < 0 )
+            self.assertTrue( 0 <= scr_out.find( 
+                "Database is busy. Skipping target '" + other_name + "'." ) )
+        finally:
+            lock_conn.execute("COMMIT")
+            lock_conn.close()
+
+        # Nothing should have changed, and no leases should be left behind.
+        self.assertEqual( self.get_new_files(), [] )
+        self.open_db( self.default_db, True )
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM '" + self.table_names['leases'] +
+                       "'")
+        self.assertEqual( cursor.fetchone()[0], 0 )
+        cursor.execute("SELECT COUNT(*) FROM '" + self.table_names['dirs'] +
+                       "' WHERE Parent_ID=-1")
+        self.assertEqual( cursor.fetchone()[0], 1 )
+        self.conn.close()
+
+    def test_prefetch(self):
+        """Tests that a rescan finds a damaged file deep in the tree, with and
+        without prefetching.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+        target_name = os.path.join('test_tree', 'rootA')
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+
+        # Damage a file, keeping its modification time.
+        file_name = os.path.join( target_name, 'TreeA', 'DirA', 'LeafA', 
+                                  'BunchOfBs.txt' )
+        with open( file_name, 'wt' ) as f:
+            f.write( 'd' * 256 + os.linesep )
+        tmp_time = mod_time.timestamp()
+        os.utime( file_name, ( tmp_time, tmp_time ) )
+
+        for prefetch in ( '0', '1', '256' ):
+            scr_out = subprocess.check_output([self.script_name, 'scan', 
+                                               '--prefetch', prefetch,
+                                               target_name],
+                                              stderr=subprocess.STDOUT,
+                                              universal_newlines=True)
+
+            # Verify results
+            self.assertEqual( scr_out.count( 'File could be damaged!' ), 1 )
+            self.assertTrue( 0 <= scr_out.find( file_name ) )
+
+    def test_ingest(self):
+        """Tests that a new root added in bulk matches one added by a regular
+        crawl, and that the indexes are rebuilt afterwards.
+        """
+
+        mod_time = datetime.datetime.fromtimestamp(int(float(time.time())))
+        check_time = mod_time
+
+        # Build tree with schema 1 and scan it both ways
+        exp_data = self.get_schema_1( mod_time, check_time )
+        self.build_tree( exp_data )
+        target_name = os.path.join('test_tree', 'rootA')
+        alt_db = 'test_crawl.db'
+        subprocess.check_output([self.script_name, 'scan', target_name],
+                                universal_newlines=True)
+        subprocess.check_output([self.script_name, '--db', alt_db, 'scan',
+                                 '--no-fast-ingest', target_name],
+                                universal_newlines=True)
+
+        try:
+            trees = []
+            for db_name in ( self.default_db, alt_db ):
+                scr_out = subprocess.check_output([self.script_name, '--db',
+                                                   db_name, 'checkdb', 
+                                                   '--rows'],
+                                                  stderr=subprocess.STDOUT,
+                                                  universal_newlines=True)
+                self.assertEqual( scr_out, '' )
+
+                self.open_db( db_name, True )
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE " +
+                               "type='index'")
+                got_names = [ row[0] for row in cursor.fetchall() ]
+                for name in brd.db_indexes:
+                    self.assertTrue( name in got_names )
+                trees.append( self.strip_fields( 
+                        self.build_tree_data_from_db( cursor ),
+                        ["File_ID", "Parent_ID", "Path_ID", "LastChecked"] ) )
+                self.conn.close()
+
+            results = self.diff_trees( trees[0], trees[1] )
+            self.assertEqual( results['left'], None )
+            self.assertEqual( results['right'], None )
+            self.assertNotEqual( len(results['common']), 0 )
+
+            # Every file should be in the journal.
+            scr_out = subprocess.check_output([self.script_name, 'changes'],
+                                              universal_newlines=True)
+            self.assertEqual( scr_out.count( 'Added file' ), 5 )
+        finally:
+            self.remove_db( alt_db )
+
     def test_root_prefix(self):
         """Tests scan subcommand with --root-prefix option.
         """
@@ -0,0 +1,112 @@
+#    brd - scans directories and files for damage due to decay of medium.
+#    Copyright (C) 2013 Jeff Backus <jeff.backus@gmail.com>
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import unittest
+import shutil
+
+from brd_unit_base import BrdUnitBase
+
+class TestSimilarTrees(BrdUnitBase):
+    """Unit tests for the similar_trees subcommand.
+    """
+
+    def setUp(self):
+        # Call superclass's setup routine.
+        super(TestSimilarTrees,self).setUp()
+
+        # Build two copies of a tree, each with a 'Big' subdirectory of 30
+        # files and a 'Small' subdirectory of 5 files. One file in 'Big'
+        # differs between the copies.
+        self.roots = [ os.path.join('test_tree', 'rootA'),
+                       os.path.join('test_tree', 'rootB') ]
+        for root in self.roots:
+            for (subdir, count) in [ ('Big', 30), ('Small', 5) ]:
+                os.makedirs( os.path.join( root, subdir ) )
+                for idx in range(count):
+                    with open( os.path.join( root, subdir,
+                                             'File' + str(idx) + '.txt' ),
+                               'wt' ) as f:
+                        f.write( subdir + str(idx) )
+        with open( os.path.join( self.roots[1], 'Big', 'File0.txt' ),
+                   'at' ) as f:
+            f.write( 'changed' )
+        subprocess.check_output([self.script_name, 'scan'] + self.roots,
+                                universal_newlines=True)
+
+    def tearDown(self):
+        # Clean up test tree
+        shutil.rmtree('test_tree')
+
+        # Call superclass's cleanup routine
+        super(TestSimilarTrees,self).tearDown()
+
+    def get_groups(self, args):
+        """Runs similar_trees with the specified arguments and returns a list
+        of (similarity, [ paths ]) tuples.
+        """
+
+        scr_out = subprocess.check_output([self.script_name,
+                                           'similar_trees'] + args,
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+        ret_val = []
+        for line in scr_out.splitlines():
+            if line.startswith('    '):
+                ret_val[-1][1].append( line.strip() )
+            else:
+                self.assertTrue( line.startswith('2 dirs with similarity ') )
+                ret_val.append( (float(line.split()[-1][:-1]), []) )
+        return ret_val
+
+    def test_similar_trees(self):
+        """Tests that similar_trees only reports the largest similar
+        subtrees.
+        """
+
+        root_paths = [ '[' + root + ']' for root in self.roots ]
+
+        # The roots share 34 of 36 fingerprints, so only they are reported.
+        groups = self.get_groups( [] )
+        self.assertEqual( len(groups), 1 )
+        self.assertTrue( 0.8 <= groups[0][0] < 1.0 )
+        self.assertEqual( groups[0][1], root_paths )
+
+        # Only 'Small' is identical in both copies.
+        groups = self.get_groups( ['--threshold', '1.0'] )
+        self.assertEqual( groups,
+                          [ ( 1.0, [ os.path.join( path, 'Small' )
+                                     for path in root_paths ] ) ] )
+        self.assertEqual( self.get_groups( ['--threshold', '1.0',
+                                            '--min-files', '6'] ), [] )
+
+        # Scope options
+        self.assertEqual( self.get_groups( ['--within', self.roots[0]] ), [] )
+        groups = self.get_groups( ['--between',
+                                   os.path.join( self.roots[0], 'Big' ),
+                                   self.roots[1]] )
+        self.assertEqual( len(groups), 1 )
+        self.assertEqual( groups[0][1],
+                          [ os.path.join( root_paths[0], 'Big' ),
+                            os.path.join( root_paths[1], 'Big' ) ] )
+
+# Allow unit test to run on its own
+if __name__ == '__main__':
+    unittest.main()